@@ -1,57 +1,115 @@
+import asyncio
+import os
 import shutil
 import subprocess
 
+# Resolved once per process; the PATH lookup is stable for the CLI's lifetime
+SSHPASS_PATH = shutil.which("sshpass")
+
+# Reuse a master SSH connection per host so reconnects skip the handshake.
+# Set CM_SSH_MULTIPLEX=0 to disable.
+SSH_MULTIPLEX = os.environ.get("CM_SSH_MULTIPLEX", "1") != "0"
+SSH_MULTIPLEX_OPTIONS = [
+    "-o",
+    "ControlMaster=auto",
+    "-o",
+    "ControlPath=~/.ssh/cm-%C",
+    "-o",
+    "ControlPersist=10m",
+]
+
 
 class ConnectionHandler:
+    # Static leading arguments of the launched command, shared by all instances
+    base_argv = ()
+    # Handlers without a command to launch yet refuse to connect
+    launchable = True
+    # Sessions that run inside the current terminal rather than their own window
+    uses_terminal = False
+
     def __init__(self, host_or_ip, username, password, protocol):
         self.host_or_ip = host_or_ip
         self.username = username
         self.password = password
         self.protocol = protocol
 
-    def connect(self):
+    def build_command(self):
         raise NotImplementedError("Subclasses should implement this method")
 
-
-class SSHHandler(ConnectionHandler):
-    protocol = "ssh"
-
-    def __init__(self, host_or_ip, username, password=None, ssh_key_path=None):
-        super().__init__(host_or_ip, username, password, protocol="ssh")
-        self.ssh_key_path = ssh_key_path
+    def before_connect(self):
+        # Runs right before the session is launched, by connect and connect_async
+        pass
 
     def connect(self):
-        # Check if sshpass is available
-        sshpass_installed = shutil.which("sshpass") is not None
-
-        ssh_command = []
+        if not self.launchable:
+            raise ConnectionHandlerException(
+                f"{self.protocol.upper()} connections are not supported yet"
+            )
+        try:
+            self.before_connect()
+            subprocess.run(self.build_command(), check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise ConnectionHandlerException(
+                f"{self.protocol.upper()} session failed to start: {e}"
+            )
 
-        # If sshpass is installed and a password is provided, use sshpass
-        if sshpass_installed and self.password is not None:
-            ssh_command.extend(["sshpass", "-p", self.password])
+    async def connect_async(self):
+        # Non-blocking variant so several sessions can be launched concurrently
+        if not self.launchable:
+            raise ConnectionHandlerException(
+                f"{self.protocol.upper()} connections are not supported yet"
+            )
+        try:
+            self.before_connect()
+            process = await asyncio.create_subprocess_exec(*self.build_command())
+        except OSError as e:
+            raise ConnectionHandlerException(
+                f"{self.protocol.upper()} session failed to start: {e}"
+            )
+        returncode = await process.wait()
+        if returncode:
+            raise ConnectionHandlerException(
+                f"{self.protocol.upper()} session exited with status {returncode}"
+            )
+        return returncode
 
-        # Add the ssh command
-        ssh_command.extend(["ssh", "-o", "StrictHostKeyChecking=no"])
 
-        # Add the path to the private key if provided
-        if self.ssh_key_path:
-            ssh_command.extend(["-i", self.ssh_key_path])
+class SSHHandler(ConnectionHandler):
+    protocol = "ssh"
+    base_argv = ("ssh", "-o", "StrictHostKeyChecking=no")
+    uses_terminal = True
 
-        # Add the username and host information
-        if self.username:
-            ssh_command.append(f"{self.username}@{self.host_or_ip}")
-        else:
-            ssh_command.append(self.host_or_ip)
-        # Open an SSH session. The -t flag forces pseudo-terminal allocation
-        #print(ssh_command)
-        try:
-            subprocess.run(ssh_command, check=True)
-        except subprocess.CalledProcessError as e:
-            raise ConnectionHandlerException(f"SSH session failed to start: {e}")
+    def __init__(
+        self, host_or_ip, username, password=None, ssh_key_path=None, port=None
+    ):
+        super().__init__(host_or_ip, username, password, protocol="ssh")
+        self.ssh_key_path = ssh_key_path
+        self.port = port
+
+    def before_connect(self):
+        # ssh can't create the ControlPath socket if ~/.ssh does not exist yet
+        if SSH_MULTIPLEX:
+            os.makedirs(os.path.expanduser("~/.ssh"), mode=0o700, exist_ok=True)
+
+    def build_command(self):
+        # Assembled in one list display rather than grown by repeated appends
+        use_sshpass = SSHPASS_PATH and self.password is not None
+        return [
+            # If sshpass is installed and a password is provided, use sshpass
+            *((SSHPASS_PATH, "-p", self.password) if use_sshpass else ()),
+            *self.base_argv,
+            *(SSH_MULTIPLEX_OPTIONS if SSH_MULTIPLEX else ()),
+            # Add the path to the private key if provided
+            *(("-i", self.ssh_key_path) if self.ssh_key_path else ()),
+            # Option and value must be separate argv entries for ssh to parse them
+            *(("-p", str(self.port)) if self.port else ()),
+            f"{self.username}@{self.host_or_ip}" if self.username else self.host_or_ip,
+        ]
 
 
 class RDPHandler(ConnectionHandler):
     protocol = "rdp"
+    base_argv = ("xfreerdp",)
 
     def __init__(
         self, host_or_ip, username, password=None, domain=None, resolution=None
@@ -60,55 +118,47 @@ class RDPHandler(ConnectionHandler):
         self.domain = domain
         self.resolution = resolution
 
-    def connect(self):
-        # RDP-specific connect code
+    def before_connect(self):
         print(f"RDP: Connecting to {self.host_or_ip} with {self.username}")
-        rdp_command = ["xfreerdp", "/v:" + f'"{self.host_or_ip}"']
-        print(rdp_command)
-        if self.username:
-            rdp_command.append("/u:" + self.username)
-        if self.password:
-            rdp_command.append("/p:" + self.password)
-        if self.domain:
-            rdp_command.append("/d:" + self.domain)
-        else:
-            rdp_command.append("/d:WORKGROUP")
-        if self.resolution:
-            rdp_command.append("/size:" + self.resolution)
-        rdp_command.append("/cert:ignore")
-        command_str = " ".join(rdp_command)
-        try:
-            subprocess.run(
-                command_str,
-                check=True,
-                shell=True,
-            )
-        except subprocess.CalledProcessError as e:
-            raise ConnectionHandlerException(f"RDP session failed to start: {e}")
+
+    def build_command(self):
+        return [
+            *self.base_argv,
+            "/v:" + self.host_or_ip,
+            *(("/u:" + self.username,) if self.username else ()),
+            *(("/p:" + self.password,) if self.password else ()),
+            "/d:" + (self.domain or "WORKGROUP"),
+            *(("/size:" + self.resolution,) if self.resolution else ()),
+            "/cert:ignore",
+        ]
 
 
 class VMRCHandler(ConnectionHandler):
     protocol = "vmrc"
+    base_argv = ("open",)
 
     def __init__(self, host_or_ip):
         super().__init__(host_or_ip, username=None, password=None, protocol="vmrc")
 
-    def connect(self):
-        vmrc_command = [f'open "{self.host_or_ip}"']
-        print(vmrc_command)
-        try:
-            subprocess.run(vmrc_command, check=True, shell=True)
-        except subprocess.CalledProcessError as e:
-            raise ConnectionHandlerException(f"vmrc session failed to start: {e}")
+    def build_command(self):
+        return [*self.base_argv, self.host_or_ip]
 
 
 class VNCHandler(ConnectionHandler):
     protocol = "vnc"
+    # VNC-specific connect code is not implemented yet
+    launchable = False
 
-    def connect(self):
-        # VNC-specific connect code
-        pass
+    def __init__(self, host_or_ip, username=None, password=None):
+        super().__init__(host_or_ip, username, password, protocol="vnc")
 
 
 class ConnectionHandlerException(Exception):
     pass
+
+
+# Protocol name -> handler class, in the order protocols are offered to users
+PROTOCOL_REGISTRY = {
+    handler.protocol: handler
+    for handler in (SSHHandler, RDPHandler, VNCHandler, VMRCHandler)
+}
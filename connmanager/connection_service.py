@@ -1,69 +1,132 @@
+import asyncio
+import functools
 import getpass
+import inspect
 import json
+import os
+import tempfile
+import textwrap
 
 from connmanager.connection_handler import (
+    PROTOCOL_REGISTRY,
     ConnectionHandlerException,
-    RDPHandler,
-    SSHHandler,
-    VMRCHandler,
-    VNCHandler,
 )
 from connmanager.print_table import print_json_as_table
 
-PROTOCOLS = ["ssh", "rdp", "vnc", "vmrc"]
+try:
+    # Importing readline gives the input() prompts line editing and history
+    import readline  # noqa: F401
+except ImportError:
+    # Not available on every platform (e.g. Windows); prompts still work
+    pass
+
+# Large write buffer so an export is flushed in a few syscalls
+EXPORT_BUFFER_SIZE = 1 << 20
+
+
+# Returns (handler class, its constructor's keyword names). The signature is
+# inspected on first use of each protocol only, so commands that never connect
+# never pay for it.
+@functools.lru_cache(maxsize=None)
+def handler_spec(protocol):
+    handler = PROTOCOL_REGISTRY[protocol]
+    parameters = inspect.signature(handler.__init__).parameters
+    return handler, frozenset(parameters) - {"self"}
 
 
 class ConnectionService:
     def __init__(self, database):
         self.database = database
 
+    # The database stays open across calls and is closed once on exit
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.database.close()
+
     def password_comparison(self):
-        password1 = getpass.getpass("Enter the password: ")
-        password2 = getpass.getpass("Re-enter the password: ")
-        if password1 == password2:
-            return password1
-        else:
+        while True:
+            password1 = getpass.getpass("Enter the password: ")
+            password2 = getpass.getpass("Re-enter the password: ")
+            if password1 == password2:
+                return password1
             print("Passwords do not match. Please try again.")
-            return self.password_comparison()
 
-    def is_ipv6(self, ip):
-        if ":" in ip:
-            return True
-        return False
+    def prompt_until_valid(self, prompt, validate, normalize=None):
+        # validate returns an error message to reprompt with, or None to accept
+        while True:
+            value = input(prompt)
+            if normalize is not None:
+                value = normalize(value)
+            error = validate(value)
+            if error is None:
+                return value
+            print(error)
 
-    def add_connection(self):
+    def prompt_extras(self, extras):
+        print("Enter extra options (key=value). Type 'done' when finished:")
+        # Read lines with input() (so readline editing applies) until 'done' or
+        # EOF, so piped input ends cleanly
         while True:
-            alias = input("Enter a unique alias for the connection: ")
-            # Check if the alias already exists
-            if alias.isdigit():
+            try:
+                extra = input().strip()
+            except EOFError:
+                break
+            if not extra:
+                continue
+            if extra.lower() == "done":
+                break
+            # partition splits on the first '=' only, so values may contain '='
+            key, sep, value = extra.partition("=")
+            key = key.strip()
+            if not sep or not key:
                 print(
-                    "Invalid alias. The alias cannot be only digits. Please try again."
+                    "Invalid format for extra options. Please use 'key=value' format."
                 )
-            elif self.database.alias_exists(alias):
-                print("This alias already exists. Please choose a different one.")
-            else:
-                break
+                continue
+            extras[key] = value.strip()
+        return extras
 
-        while True:
-            protocol = input(f"Enter the protocol (e.g. {', '.join(PROTOCOLS)}): ")
-            if protocol not in PROTOCOLS:
-                print(f"Invalid protocol. Please enter {', '.join(PROTOCOLS)}.")
-            else:
-                break
+    def add_connection(self):
+        alias = self.prompt_until_valid(
+            "Enter a unique alias for the connection: ",
+            # Check if the alias already exists
+            lambda alias: (
+                "Invalid alias. The alias cannot be only digits. Please try again."
+                if alias.isdigit()
+                else "This alias already exists. Please choose a different one."
+                if self.database.alias_exists(alias)
+                else None
+            ),
+        )
+
+        protocol_names = ", ".join(PROTOCOL_REGISTRY)
+        protocol = self.prompt_until_valid(
+            f"Enter the protocol (e.g. {protocol_names}): ",
+            lambda protocol: (
+                None
+                if protocol in PROTOCOL_REGISTRY
+                else f"Invalid protocol. Please enter {protocol_names}."
+            ),
+            normalize=lambda protocol: protocol.strip().lower(),
+        )
 
-        if protocol.casefold() == "vmrc":
+        if protocol == "vmrc":
             host_or_ip = input(
                 "Enter vmrc URL (e.g. vmrc://<esxi-host>/?moid=<vmid>): "
             )
             port = None
             username = None
         else:
-            while True:
-                host_or_ip = input("Enter the hostname or IP address: ")
-                if not host_or_ip:
-                    print("Invalid hostname or IP address. Please try again.")
-                else:
-                    break
+            host_or_ip = self.prompt_until_valid(
+                "Enter the hostname or IP address: ",
+                lambda host_or_ip: (
+                    None
+                    if host_or_ip
+                    else "Invalid hostname or IP address. Please try again."
+                ),
+            )
 
             port = input("Enter the port (press Enter for default): ") or None
             username = (
@@ -76,7 +139,7 @@ class ConnectionService:
         tag = None
 
         # Protocol-specific fields
-        if protocol.casefold() == "ssh":
+        if protocol == "ssh":
             auth_method = (
                 input(
                     "Choose authentication method, password or key (default: password): "
@@ -93,65 +156,52 @@ class ConnectionService:
                 )
             else:
                 password = self.password_comparison()
-        elif protocol.casefold() == "rdp":
-            if (
-                self.is_ipv6(host_or_ip)
-                and not host_or_ip.startswith("[")
-                and not host_or_ip.endswith("]")
-            ):
+        elif protocol == "rdp":
+            # Bracket bare IPv6 addresses
+            if ":" in host_or_ip and not host_or_ip.startswith("["):
                 host_or_ip = f"[{host_or_ip}]"
             password = self.password_comparison()
             domain = input("Enter the domain (press Enter if not applicable): ") or None
             resolution = input("Enter the resolution (e.g., 1920x1080): ") or None
         # Add other protocol-specific fields as needed
 
-        while True:
-            tag = input("Enter an optional tag (i.e lab, tools, personal): ") or None
-            if tag in PROTOCOLS:
-                print("Invalid tag. Unable to use protocol as a tag.")
-            else:
-                break
+        tag = self.prompt_until_valid(
+            "Enter an optional tag (i.e lab, tools, personal): ",
+            lambda tag: (
+                "Invalid tag. Unable to use protocol as a tag."
+                if tag in PROTOCOL_REGISTRY
+                else None
+            ),
+            normalize=lambda tag: tag or None,
+        )
 
         # Collect extras
-        extras = {}
-        print("Enter extra options (key=value). Type 'done' when finished:")
-        while True:
-            extra = input().strip()
-            if extra.lower() == "done":
-                break
-            try:
-                key, value = extra.split("=")
-                extras[key.strip()] = value.strip()
-            except ValueError:
-                print(
-                    "Invalid format for extra options. Please use 'key=value' format."
-                )
+        extras = self.prompt_extras({})
         try:
-            # Use a dictionary to pass only relevant fields based on the protocol
+            # Use a dictionary to pass only relevant fields based on the protocol.
+            # Optional fields are added only when set, in the same pass
             connection_details = {
                 "alias": alias,
                 "protocol": protocol,
                 "host_or_ip": host_or_ip,
-                "port": port,
-                "username": username,
-                "password": password,
-                "ssh_key_path": ssh_key_path,
-                "domain": domain,
-                "resolution": resolution,
-                "tag": tag,
                 "extras": extras,
             }
-            # Filter out None values, as they are not needed
-            connection_details = {
-                k: v for k, v in connection_details.items() if v is not None
-            }
+            for key, value in (
+                ("port", port),
+                ("username", username),
+                ("password", password),
+                ("ssh_key_path", ssh_key_path),
+                ("domain", domain),
+                ("resolution", resolution),
+                ("tag", tag),
+            ):
+                if value is not None:
+                    connection_details[key] = value
 
             self.database.add_connection(**connection_details)
             print("Connection added successfully.")
         except Exception as e:
             print(f"Error adding connection: {e}")
-        finally:
-            self.database.close()
 
     def edit_connection(self, alias_or_id):
         try:
@@ -166,9 +216,9 @@ class ConnectionService:
             # Display current values and prompt for new values
             alias = input(f"Alias [{connection['alias']}]: ") or connection["alias"]
             protocol = (
-                input(f"Protocol [{connection['protocol']}]: ")
+                input(f"Protocol [{connection['protocol']}]: ").strip()
                 or connection["protocol"]
-            )
+            ).lower()
             host_or_ip = (
                 input(f"Hostname or IP [{connection['host_or_ip']}]: ")
                 or connection["host_or_ip"]
@@ -185,7 +235,7 @@ class ConnectionService:
             resolution = None
 
             # Protocol-specific fields
-            if protocol.casefold() == "ssh":
+            if protocol == "ssh":
                 auth_method = input(
                     f"Authentication method (password/key) [{connection.get('ssh_key_path', 'password')}]: "
                 ).strip().lower() or (
@@ -199,7 +249,7 @@ class ConnectionService:
                     password = getpass.getpass(
                         "Enter the password (press Enter to keep current): "
                     ) or connection.get("password", None)
-            elif protocol.casefold() == "rdp":
+            elif protocol == "rdp":
                 password = getpass.getpass(
                     "Enter the password (press Enter to keep current): "
                 ) or connection.get("password", None)
@@ -211,43 +261,30 @@ class ConnectionService:
                 ) or connection.get("resolution", None)
             # Add other protocol-specific fields as needed
             # Collect extras
-            extras = connection.get("extras", {})
-            print("Enter extra options (key=value). Type 'done' when finished:")
-            while True:
-                extra = input().strip()
-                if extra.lower() == "done":
-                    break
-                try:
-                    key, value = extra.split("=")
-                    extras[key.strip()] = value.strip()
-                except ValueError:
-                    print(
-                        "Invalid format for extra options. Please use 'key=value' format."
-                    )
+            extras = self.prompt_extras(connection.get("extras", {}))
             try:
-                # Use a dictionary to pass only relevant fields based on the protocol
+                # Use a dictionary to pass only relevant fields based on the protocol.
+                # Optional fields are added only when set, in the same pass
                 connection_details = {
                     "alias": alias,
                     "protocol": protocol,
                     "host_or_ip": host_or_ip,
-                    "port": port,
-                    "username": username,
-                    "password": password,
-                    "ssh_key_path": ssh_key_path,
-                    "domain": domain,
-                    "resolution": resolution,
                     "extras": extras,
                 }
-                # Filter out None values, as they are not needed
-                connection_details = {
-                    k: v for k, v in connection_details.items() if v is not None
-                }
+                for key, value in (
+                    ("port", port),
+                    ("username", username),
+                    ("password", password),
+                    ("ssh_key_path", ssh_key_path),
+                    ("domain", domain),
+                    ("resolution", resolution),
+                ):
+                    if value is not None:
+                        connection_details[key] = value
                 self.database.update_connection(alias_or_id, **connection_details)
                 print("Connection updated successfully.")
             except Exception as e:
                 print(f"Error updating connection: {e}")
-            finally:
-                self.database.close()
         except Exception as e:
             print(f"An error occurred while editing connection: {e}")
 
@@ -258,140 +295,192 @@ class ConnectionService:
             print(f"Connection '{alias_or_id}' deleted successfully.")
         except Exception as e:
             print(f"An error occurred while deleting connection: {e}")
-        finally:
-            self.database.close()
 
     def get_connections_summary(self, protocol_or_tag):
         try:
-            connections = self.database.get_connection_summary()
-            if protocol_or_tag:
-                if protocol_or_tag in PROTOCOLS:
-                    connections = [
-                        x for x in connections if x["protocol"] == protocol_or_tag
-                    ]
-                else:
-                    connections = [
-                        x for x in connections if x["tag"] == protocol_or_tag
-                    ]
+            if not protocol_or_tag:
+                connections = self.database.get_connection_summary()
+            elif protocol_or_tag in PROTOCOL_REGISTRY:
+                connections = self.database.get_connection_summary(
+                    protocol=protocol_or_tag
+                )
+            else:
+                connections = self.database.get_connection_summary(tag=protocol_or_tag)
             if connections:
                 print_json_as_table(connections)
             else:
                 print("No connections found.")
         except Exception as e:
             print(f"An error occurred while getting connections {e}")
-        finally:
-            self.database.close()
 
-    def search_connections(self, search_info):
+    def search_connections(self, search_info, prefix=False):
         try:
             # Search for connections in the database
-            results = self.database.search_connections(search_info)
+            results = self.database.search_connections(search_info, prefix)
             if results:
                 print_json_as_table(results, title="Search Results")
             else:
                 print("No connections found matching the search criteria.")
         except Exception as e:
             print(f"An error occurred while searching for connections: {e}")
-        finally:
-            self.database.close()
+
+    def build_handler(self, alias_or_id):
+        # Same id-or-alias lookup as edit, resolved in one place by the database
+        connection_details = self.database.get_connection(alias_or_id)
+        if not connection_details:
+            print(f"No connection found with alias or ID of: '{alias_or_id}'.")
+            return None
+
+        protocol = connection_details["protocol"]
+        # Stored protocols are normally lowercase already; only fold if not
+        if protocol not in PROTOCOL_REGISTRY:
+            protocol = protocol.lower()
+        if protocol not in PROTOCOL_REGISTRY:
+            print(f"Unsupported protocol: {protocol}")
+            return None
+
+        # Create the handler from the stored fields its constructor accepts
+        handler_cls, handler_kwargs = handler_spec(protocol)
+        return handler_cls(
+            **{
+                key: value
+                for key, value in connection_details.items()
+                if key in handler_kwargs
+            }
+        )
 
     def connect_to_alias_or_id(self, alias_or_id):
         try:
-            if alias_or_id.isdigit():
-                connection_details = self.database.get_connection_by_id(
-                    int(alias_or_id)
-                )
-            else:
-                connection_details = self.database.get_connection_by_alias(alias_or_id)
-            if not connection_details:
-                print(f"No connection found with alias or ID of: '{alias_or_id}'.")
+            handler = self.build_handler(alias_or_id)
+            if handler is None:
                 return
-
-            # Extract common connection parameters
-            host_or_ip = connection_details["host_or_ip"]
-            username = connection_details["username"]
-            password = connection_details["password"]
-            protocol = connection_details["protocol"]
-            domain = connection_details["domain"]
-            resolution = connection_details["resolution"]
-            ssh_key_path = connection_details["ssh_key_path"]
-
-            # Determine the protocol and create the appropriate handler
-            if protocol.casefold() == "ssh":
-                try:
-                    ssh_handler = SSHHandler(
-                        host_or_ip, username, password, ssh_key_path
-                    )
-                    ssh_handler.connect()
-                except ConnectionHandlerException:
-                    print("SSH connection failed/timed out")
-            elif protocol.casefold() == "rdp":
-                try:
-                    rdp_handler = RDPHandler(
-                        host_or_ip, username, password, domain, resolution
-                    )
-                    rdp_handler.connect()
-                except ConnectionHandlerException:
-                    print(f"RDP connection failed/timed out")
-            elif protocol.casefold() == "vmrc":
-                try:
-                    vmrc_handler = VMRCHandler(host_or_ip)
-                    vmrc_handler.connect()
-                except ConnectionHandlerException as e:
-                    print(f"VMRC connection failed/timed out")
-            elif protocol.casefold() == "vnc":
-                try:
-                    vnc_handler = VNCHandler(host_or_ip, username, password)
-                    vnc_handler.connect()
-                except ConnectionHandlerException as e:
-                    print(f"VNC: Error establishing connection: {e}")
-            else:
-                print(f"Unsupported protocol: {protocol}")
+            try:
+                handler.connect()
+            except ConnectionHandlerException as e:
+                print(f"Connection failed/timed out: {e}")
 
         except Exception as e:
             print(f"An error occurred while connecting: {e}")
-        finally:
-            self.database.close()
+
+    def connect_many(self, aliases_or_ids):
+        # Windowed sessions (RDP, VMRC) are launched concurrently. Sessions that
+        # use the terminal (SSH) would fight over the tty, so they run one after
+        # another while the windowed ones are open
+        handlers = []
+        for alias_or_id in aliases_or_ids:
+            try:
+                handler = self.build_handler(alias_or_id)
+            except Exception as e:
+                print(f"An error occurred while connecting: {e}")
+                continue
+            if handler is not None:
+                handlers.append((alias_or_id, handler))
+        if not handlers:
+            return
+
+        windowed = [entry for entry in handlers if not entry[1].uses_terminal]
+        in_terminal = [entry for entry in handlers if entry[1].uses_terminal]
+
+        async def connect_in_turn():
+            results = []
+            for _, handler in in_terminal:
+                try:
+                    results.append(await handler.connect_async())
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        async def connect_all():
+            windowed_results, in_terminal_results = await asyncio.gather(
+                asyncio.gather(
+                    *(handler.connect_async() for _, handler in windowed),
+                    return_exceptions=True,
+                ),
+                connect_in_turn(),
+            )
+            return windowed_results + in_terminal_results
+
+        results = asyncio.run(connect_all())
+        for (alias_or_id, _), result in zip(windowed + in_terminal, results):
+            if isinstance(result, Exception):
+                print(f"Connection to '{alias_or_id}' failed/timed out: {result}")
 
     def import_connections(self, json_file):
         try:
             with open(json_file, "r") as file:
                 connections = json.load(file)
-                for connection in connections:
-                    # Remove the 'id' field if it exists
-                    connection.pop("id", None)
-                    alias = connection.get("alias")
-                    if self.database.alias_exists(alias):
-                        choice = (
-                            input(
-                                f"Alias '{alias}' already exists. Do you want to overwrite it? (y/n): "
-                            )
-                            .strip()
-                            .lower()
+            # Look up every alias in one query instead of one query per row
+            existing = self.database.existing_aliases(
+                connection.get("alias") for connection in connections
+            )
+            # Writes are applied in bulk once all prompts are answered
+            pending = {}
+            overwrites = []
+            for connection in connections:
+                # Remove the 'id' field if it exists
+                connection.pop("id", None)
+                alias = connection.get("alias")
+                if alias in existing or alias in pending:
+                    choice = (
+                        input(
+                            f"Alias '{alias}' already exists. Do you want to overwrite it? (y/n): "
                         )
-                        if choice == "y":
-                            self.database.update_connection(alias, **connection)
-                            print(f"Connection '{alias}' overwritten.")
-                        else:
-                            print(f"Connection '{alias}' skipped.")
+                        .strip()
+                        .lower()
+                    )
+                    if choice != "y":
+                        print(f"Connection '{alias}' skipped.")
+                    elif alias in pending:
+                        # Like an update: fields the new record omits are kept
+                        pending[alias] = {**pending[alias], **connection}
                     else:
-                        self.database.add_connection(**connection)
-                        print(f"Connection '{alias}' added.")
+                        overwrites.append((alias, connection))
+                else:
+                    pending[alias] = connection
+            # Overwrites and additions are committed together, or not at all
+            with self.database.transaction():
+                self.database.bulk_update_connections(overwrites)
+                self.database.bulk_add_connections(pending.values())
+            for alias, _ in overwrites:
+                print(f"Connection '{alias}' overwritten.")
+            for alias in pending:
+                print(f"Connection '{alias}' added.")
             print(f"Connections imported successfully from {json_file}.")
         except Exception as e:
             print(f"An error occurred while importing connections: {e}")
-        finally:
-            self.database.close()
 
-    def export_connections(self, json_file):
+    def export_connections(self, json_file, indent=None):
+        temp_path = None
         try:
-            connections = self.database.get_all_connections()
-            for connection in connections:
-                connection.pop("id", None)
-            with open(json_file, "w") as file:
-                json.dump(connections, file, indent=4)
+            connections = self.database.iter_all_connections()
+            # Compact by default: smaller files that are faster to re-import
+            separators = (",", ":") if indent is None else (",", ": ")
+            # Write next to the target and swap it in at the end, so a failed
+            # export never leaves json_file truncated or half written
+            with tempfile.NamedTemporaryFile(
+                "w",
+                buffering=EXPORT_BUFFER_SIZE,
+                dir=os.path.dirname(os.path.abspath(json_file)),
+                suffix=".tmp",
+                delete=False,
+            ) as file:
+                temp_path = file.name
+                # Serialize one record at a time instead of dumping the whole
+                # list, so the JSON text is never built in memory in one piece
+                file.write("[")
+                count = 0
+                for connection in connections:
+                    record = json.dumps(
+                        connection, indent=indent, separators=separators
+                    )
+                    if indent is not None:
+                        record = "\n" + textwrap.indent(record, " " * indent)
+                    file.write("," + record if count else record)
+                    count += 1
+                file.write("\n]" if indent is not None and count else "]")
+            os.replace(temp_path, json_file)
             print(f"Connections exported successfully to {json_file}.")
         except Exception as e:
+            if temp_path is not None and os.path.exists(temp_path):
+                os.remove(temp_path)
             print(f"An error occurred while exporting connections: {e}")
-        finally:
-            self.database.close()
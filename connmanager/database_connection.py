@@ -1,17 +1,113 @@
+import contextlib
+import functools
 import json
+import logging
 import sqlite3
+from collections import namedtuple
+from operator import attrgetter
+
+logger = logging.getLogger(__name__)
+
+# Every stored field except the internal id
+CONNECTION_COLUMNS = (
+    "alias, protocol, host_or_ip, port, username, password, ssh_key_path, "
+    "domain, resolution, tag, extras"
+)
+
+INSERT_CONNECTION = f"""
+    INSERT INTO connections ({CONNECTION_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Full-text index over the searchable columns. The trigram tokenizer matches
+# arbitrary substrings (like LIKE '%term%') for terms of 3+ characters.
+SEARCH_COLUMNS = "alias, host_or_ip, username, protocol, tag"
+SEARCH_INDEX_STATEMENTS = (
+    f"""
+    CREATE VIRTUAL TABLE connections_fts USING fts5(
+        {SEARCH_COLUMNS}, content='connections', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER connections_fts_ai AFTER INSERT ON connections BEGIN
+        INSERT INTO connections_fts(rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, new.alias, new.host_or_ip, new.username, new.protocol, new.tag);
+    END
+    """,
+    f"""
+    CREATE TRIGGER connections_fts_ad AFTER DELETE ON connections BEGIN
+        INSERT INTO connections_fts(connections_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.alias, old.host_or_ip, old.username, old.protocol, old.tag);
+    END
+    """,
+    f"""
+    CREATE TRIGGER connections_fts_au AFTER UPDATE ON connections BEGIN
+        INSERT INTO connections_fts(connections_fts, rowid, {SEARCH_COLUMNS})
+        VALUES ('delete', old.id, old.alias, old.host_or_ip, old.username, old.protocol, old.tag);
+        INSERT INTO connections_fts(rowid, {SEARCH_COLUMNS})
+        VALUES (new.id, new.alias, new.host_or_ip, new.username, new.protocol, new.tag);
+    END
+    """,
+    # Index rows that existed before the search index was created
+    "INSERT INTO connections_fts(connections_fts) VALUES ('rebuild')",
+)
+MIN_INDEXED_SEARCH_LENGTH = 3
+
+# Rows of the list and search views. They are only printed, so a namedtuple
+# built straight from the result tuple is enough and lighter than sqlite3.Row
+SummaryRow = namedtuple("SummaryRow", "id alias protocol host_or_ip tag")
+
+
+def _summary_row(cursor, row):
+    return SummaryRow._make(row)
+
+
+# Most rows share the same few extras strings (usually "{}"), so parses are cached
+@functools.lru_cache(maxsize=256)
+def _parse_extras(extras_json):
+    try:
+        extras = json.loads(extras_json)
+    except (TypeError, ValueError):
+        return {}
+    return extras if isinstance(extras, dict) else {}
+
+
+def _extras_json(extras):
+    # Extras read back from an export may already be a JSON string. New values
+    # are stored compactly and without escaping non-ASCII text
+    if not extras:
+        return "{}"
+    if isinstance(extras, str):
+        return extras
+    return json.dumps(extras, ensure_ascii=False, separators=(",", ":"))
+
+
+def _connection_dict(row):
+    connection = dict(row)
+    # Cached parses are shared, so every caller gets its own copy to modify
+    connection["extras"] = dict(_parse_extras(connection["extras"]))
+    return connection
+
+
+# Stay well under SQLite's limit on bound parameters per statement
+MAX_QUERY_PARAMS = 500
 
 
 class DatabaseConnection:
     def __init__(self, db_path):
         self.db_path = db_path
         self.conn = sqlite3.connect(self.db_path)
+        self._transaction_depth = 0
+        # WAL makes each commit a single append + fsync; NORMAL sync is safe in WAL
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
         self.conn.row_factory = sqlite3.Row  # Set the row_factory to sqlite3.Row
-        self.cursor = self.conn.cursor()  # Initialize the cursor
         self.create_table()
 
     def create_table(self):
-        self.cursor.execute(
+        self.conn.execute(
             """
             CREATE TABLE IF NOT EXISTS connections (
                 id INTEGER PRIMARY KEY,
@@ -29,9 +125,39 @@ class DatabaseConnection:
             )
         """
         )
+        # Indexes for the list command's protocol and tag filters
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_connections_protocol ON connections(protocol)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_connections_tag ON connections(tag)"
+        )
+        # Case-insensitive indexes let prefix LIKE searches use index range scans
+        for column in SEARCH_COLUMNS.split(", "):
+            self.conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_connections_{column}_nocase "
+                f"ON connections({column} COLLATE NOCASE)"
+            )
         self.conn.commit()
+        self.search_index = self.create_search_index()
 
-    def add_connection(
+    def create_search_index(self):
+        cursor = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'connections_fts'"
+        )
+        if cursor.fetchone():
+            return True
+        # Not every SQLite build ships FTS5 with the trigram tokenizer; search
+        # falls back to LIKE scans without it
+        try:
+            with self.conn:
+                for statement in SEARCH_INDEX_STATEMENTS:
+                    self.conn.execute(statement)
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    def _connection_row(
         self,
         alias,
         protocol,
@@ -45,160 +171,247 @@ class DatabaseConnection:
         tag=None,
         extras=None,
     ):
-        # Convert extras dictionary to a JSON string
-        extras_json = json.dumps(extras) if extras else "{}"
-        # cursor = self.conn.cursor()
-        self.cursor.execute(
-            """
-            INSERT INTO connections (alias, protocol, host_or_ip, port, username, password, ssh_key_path, domain, resolution, tag, extras)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                alias,
-                protocol,
-                host_or_ip,
-                port,
-                username,
-                password,
-                ssh_key_path,
-                domain,
-                resolution,
-                tag,
-                extras_json,
-            ),
+        return (
+            alias,
+            protocol,
+            host_or_ip,
+            port,
+            username,
+            password,
+            ssh_key_path,
+            domain,
+            resolution,
+            tag,
+            _extras_json(extras),
         )
-        self.conn.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        # Commits (or rolls back) once when the outermost block exits, so a
+        # sequence of writes wrapped in it costs a single commit. Nested blocks
+        # join the enclosing transaction
+        self._transaction_depth += 1
+        try:
+            yield
+        except BaseException:
+            if self._transaction_depth == 1:
+                self.conn.rollback()
+            raise
+        else:
+            if self._transaction_depth == 1:
+                self.conn.commit()
+        finally:
+            self._transaction_depth -= 1
+
+    def add_connection(self, **connection_details):
+        with self.transaction():
+            self.conn.execute(
+                INSERT_CONNECTION, self._connection_row(**connection_details)
+            )
+
+    def bulk_add_connections(self, connections):
+        # One executemany in one transaction: a single commit for all rows
+        rows = [self._connection_row(**connection) for connection in connections]
+        with self.transaction():
+            self.conn.executemany(INSERT_CONNECTION, rows)
+
+    def _by_key(self, alias_or_id):
+        # Aliases can't be all digits, so a numeric key is always an id. Matching
+        # one column lets SQLite use the rowid or the alias index directly
+        if isinstance(alias_or_id, int) or alias_or_id.isdigit():
+            return "id = ?", int(alias_or_id)
+        return "alias = ?", alias_or_id
 
     def delete_connection(self, alias_or_id):
         try:
-            query = "DELETE FROM connections WHERE alias = ? OR id = ?"
-            self.cursor.execute(query, (alias_or_id, alias_or_id))
-            self.conn.commit()
+            condition, key = self._by_key(alias_or_id)
+            with self.transaction():
+                self.conn.execute(f"DELETE FROM connections WHERE {condition}", (key,))
         except Exception as e:
-            print(f"An error occurred while deleting the connection: {e}")
-            self.conn.rollback()
+            logger.error("An error occurred while deleting the connection: %s", e)
 
     def edit_connection(
         self, connection_id, protocol, host_or_ip, port, username, password
     ):
-        # cursor = self.conn.cursor()
-        self.cursor.execute(
-            """
-            UPDATE connections
-            SET protocol=?, host_or_ip=?, port=?, username=?, password=?
-            WHERE id=?
-        """,
-            (protocol, host_or_ip, port, username, password, connection_id),
-        )
-        self.conn.commit()
+        with self.transaction():
+            self.conn.execute(
+                """
+                UPDATE connections
+                SET protocol=?, host_or_ip=?, port=?, username=?, password=?
+                WHERE id=?
+            """,
+                (protocol, host_or_ip, port, username, password, connection_id),
+            )
+
+    def _summary_cursor(self):
+        cursor = self.conn.cursor()
+        cursor.row_factory = _summary_row
+        return cursor
+
+    def _like_search(self, cursor, search_pattern):
+        query = """
+        SELECT id, alias, protocol, host_or_ip, tag FROM connections
+        WHERE alias LIKE ? OR host_or_ip LIKE ? OR username LIKE ? OR protocol LIKE ? OR tag LIKE ?
+        """
+        # No ORDER BY: it makes SQLite scan the table instead of using the
+        # NOCASE indexes, so the (few) matches are sorted here instead
+        cursor.execute(query, (search_pattern,) * 5)
+        return sorted(cursor.fetchall(), key=attrgetter("id"))
 
-    def search_connections(self, search_info):
+    def search_connections(self, search_info, prefix=False):
         try:
-            query = """
-            SELECT id, alias, protocol, host_or_ip, tag FROM connections
-            WHERE alias LIKE ? OR host_or_ip LIKE ? OR username LIKE ? OR protocol LIKE ? OR tag LIKE ?
-            """
-            search_pattern = f"%{search_info}%"
-            self.cursor.execute(
-                query,
-                (
-                    search_pattern,
-                    search_pattern,
-                    search_pattern,
-                    search_pattern,
-                    search_pattern,
-                ),
-            )
-            results = self.cursor.fetchall()
-            if results:
-                columns = [column[0] for column in self.cursor.description]
-                return [dict(zip(columns, result)) for result in results]
-            return []
+            cursor = self._summary_cursor()
+            if prefix:
+                # An anchored pattern is answered from the NOCASE indexes
+                return self._like_search(cursor, f"{search_info}%")
+            if self.search_index and len(search_info) >= MIN_INDEXED_SEARCH_LENGTH:
+                # Quoted as an FTS5 string so punctuation is matched literally
+                phrase = '"' + search_info.replace('"', '""') + '"'
+                cursor.execute(
+                    """
+                    SELECT c.id, c.alias, c.protocol, c.host_or_ip, c.tag
+                    FROM connections_fts JOIN connections c ON c.id = connections_fts.rowid
+                    WHERE connections_fts MATCH ? ORDER BY c.id
+                    """,
+                    (phrase,),
+                )
+                return cursor.fetchall()
+            return self._like_search(cursor, f"%{search_info}%")
         except Exception as e:
-            print(f"An error occurred while searching for connections: {e}")
+            logger.error("An error occurred while searching for connections: %s", e)
             return []
 
     def get_connections_by_protocol(self, protocol):
         try:
-            self.cursor.execute(
+            cursor = self.conn.execute(
                 "SELECT * FROM connections WHERE protocol = ?", (protocol,)
             )
-            return [dict(row) for row in self.cursor.fetchall()]
+            return [_connection_dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            print(f"An error occurred: {e}")
+            logger.error("An error occurred: %s", e)
             return []
 
-    def get_connection_summary(self):
+    def get_connection_summary(self, protocol=None, tag=None):
         try:
-            self.cursor.execute(
-                "SELECT id, alias, protocol, host_or_ip, tag FROM connections ORDER BY id"
+            # Filter in SQL so unmatched rows never leave the database
+            conditions = []
+            params = []
+            if protocol is not None:
+                conditions.append("protocol = ?")
+                params.append(protocol)
+            if tag is not None:
+                conditions.append("tag = ?")
+                params.append(tag)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor = self._summary_cursor()
+            cursor.execute(
+                f"SELECT id, alias, protocol, host_or_ip, tag FROM connections {where} ORDER BY id",
+                params,
             )
-            return [dict(row) for row in self.cursor.fetchall()]
+            return cursor.fetchall()
         except sqlite3.Error as e:
-            print(f"An error occurred: {e}")
+            logger.error("An error occurred: %s", e)
             return []
 
     def get_connection_by_alias(self, alias):
-        self.cursor.execute("SELECT * FROM connections WHERE alias = ?", (alias,))
-        row = self.cursor.fetchone()
+        cursor = self.conn.execute(
+            "SELECT * FROM connections WHERE alias = ?", (alias,)
+        )
+        row = cursor.fetchone()
         if row:
-            return dict(row)
+            return _connection_dict(row)
         else:
             raise ValueError(f"Connection with alias '{alias}' not found")
 
     def get_connection_by_id(self, id):
-        self.cursor.execute("SELECT * FROM connections WHERE id = ?", (id,))
-        row = self.cursor.fetchone()
+        cursor = self.conn.execute("SELECT * FROM connections WHERE id = ?", (id,))
+        row = cursor.fetchone()
         if row:
-            return dict(row)
+            return _connection_dict(row)
         else:
             raise ValueError(f"Connection with id '{id}' not found")
 
     def get_connection(self, alias_or_id):
         try:
-            query = "SELECT * FROM connections WHERE alias = ? OR id = ?"
-            self.cursor.execute(query, (alias_or_id, alias_or_id))
-            result = self.cursor.fetchone()
-            if result:
-                columns = [column[0] for column in self.cursor.description]
-                return dict(zip(columns, result))
-            return None
+            condition, key = self._by_key(alias_or_id)
+            cursor = self.conn.execute(
+                f"SELECT * FROM connections WHERE {condition}", (key,)
+            )
+            result = cursor.fetchone()
+            return _connection_dict(result) if result else None
         except Exception as e:
-            print(f"An error occurred while retrieving the connection: {e}")
+            logger.error("An error occurred while retrieving the connection: %s", e)
             return None
 
+    def _update_query(self, alias_or_id, connection_details):
+        # Construct the update query
+        set_clause = ", ".join([f"{key} = ?" for key in connection_details.keys()])
+        condition, key = self._by_key(alias_or_id)
+        query = f"UPDATE connections SET {set_clause} WHERE {condition}"
+        if "extras" in connection_details:
+            connection_details = {
+                **connection_details,
+                "extras": _extras_json(connection_details["extras"]),
+            }
+        params = list(connection_details.values()) + [key]
+        return query, params
+
     def update_connection(self, alias_or_id, **connection_details):
         try:
-            # Construct the update query
-            set_clause = ", ".join([f"{key} = ?" for key in connection_details.keys()])
-            query = f"UPDATE connections SET {set_clause} WHERE alias = ? OR id = ?"
-            params = list(connection_details.values()) + [alias_or_id, alias_or_id]
-
             # Execute the update query
-            self.cursor.execute(query, params)
-            self.conn.commit()
+            with self.transaction():
+                self.conn.execute(*self._update_query(alias_or_id, connection_details))
         except Exception as e:
-            print(f"An error occurred while updating the connection: {e}")
-            self.conn.rollback()
+            logger.error("An error occurred while updating the connection: %s", e)
+
+    def bulk_update_connections(self, updates):
+        # Apply (alias_or_id, connection_details) pairs with a single commit
+        with self.transaction():
+            for alias_or_id, connection_details in updates:
+                self.conn.execute(*self._update_query(alias_or_id, connection_details))
+
+    def iter_all_connections(self):
+        # Rows are yielded as they are read, so callers never hold the full
+        # table; a dedicated cursor keeps other queries from disturbing it.
+        # The id is local to this database, so it is never selected
+        cursor = self.conn.execute(f"SELECT {CONNECTION_COLUMNS} FROM connections")
+        for row in cursor:
+            yield _connection_dict(row)
 
     def get_all_connections(self):
         try:
-            self.cursor.execute("SELECT * FROM connections")
-            results = self.cursor.fetchall()
-            if results:
-                columns = [column[0] for column in self.cursor.description]
-                return [dict(zip(columns, result)) for result in results]
-            return []
+            return list(self.iter_all_connections())
         except Exception as e:
-            print(f"An error occurred while retrieving all connections: {e}")
+            logger.error("An error occurred while retrieving all connections: %s", e)
             return []
 
+    def existing_aliases(self, aliases):
+        # Check many aliases with a few IN queries instead of one query each
+        aliases = list(aliases)
+        found = set()
+        for start in range(0, len(aliases), MAX_QUERY_PARAMS):
+            chunk = aliases[start : start + MAX_QUERY_PARAMS]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = self.conn.execute(
+                f"SELECT alias FROM connections WHERE alias IN ({placeholders})", chunk
+            )
+            found.update(row[0] for row in cursor.fetchall())
+        return found
+
     def alias_exists(self, alias):
-        query = "SELECT COUNT(*) FROM connections WHERE alias = ?"
-        # cursor = self.conn.cursor()
-        self.cursor.execute(query, (alias,))
-        return self.cursor.fetchone()[0] > 0
+        # Stops at the first match instead of counting them
+        query = "SELECT 1 FROM connections WHERE alias = ? LIMIT 1"
+        cursor = self.conn.execute(query, (alias,))
+        return cursor.fetchone() is not None
 
     def close(self):
-        self.cursor.close()  # Close the cursor
-        self.conn.close()  # Close the connection
+        # Refresh planner statistics where they are stale; the limit keeps
+        # this cheap on large tables
+        try:
+            self.conn.execute("PRAGMA analysis_limit=400")
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.Error as e:
+            # Only an optimization (e.g. the database is locked or read-only)
+            logger.warning("Skipped optimizing the database: %s", e)
+        finally:
+            self.conn.close()  # Close the connection
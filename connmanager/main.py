@@ -1,16 +1,16 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
 import os
 import sys
 
-from connmanager.connection_service import ConnectionService
-from connmanager.database_connection import DatabaseConnection
+# Expanded when the database is opened, so --help and bad args skip it
+DB_PATH = "~/.cm.db"
 
-DB_PATH = os.path.expanduser("~/.cm.db")
 
-
-# Parse command line arguments
+# Parse command line arguments. The parser is built once and must not be mutated
+@functools.lru_cache(maxsize=1)
 def parse_args():
 
     parser = argparse.ArgumentParser(description="Manage connections.")
@@ -26,7 +26,10 @@ def parse_args():
         "connect", help='Connect to a host by alias or id. Can be shortened to "c".'
     )
     parser_connect.add_argument(
-        "alias_or_id", help="The alias or id of the connection to connect to."
+        "alias_or_id",
+        nargs="+",
+        help="The alias or id of the connection to connect to. Several may be "
+        "given to open their sessions concurrently.",
     )
 
     # Create the parser for the "list" command
@@ -47,6 +50,11 @@ def parse_args():
         help='Search all aliases and IP/hostnames in the table and return all matches. Can be shortened to "s".',
     )
     parser_search.add_argument("text", help="The text pattern to search for.")
+    parser_search.add_argument(
+        "--prefix",
+        action="store_true",
+        help="Only match fields that start with the text (uses indexes).",
+    )
 
     parser_delete = subparsers.add_parser(
         "delete", help='Delete connection by alias name. Can be shortened to "d".'
@@ -75,31 +83,60 @@ def parse_args():
     parser_export.add_argument(
         "json_file", help="The JSON file to export connections to."
     )
+    parser_export.add_argument(
+        "--indent",
+        type=int,
+        default=None,
+        help="Pretty-print the JSON with this many spaces of indentation.",
+    )
 
     return parser
 
 
+# Map for shortened aliases to full command names
+COMMAND_ALIASES = {
+    "a": "add",
+    "l": "list",
+    "s": "search",
+    "c": "connect",
+    "d": "delete",
+    "e": "edit",
+    "i": "import",
+    "x": "export",
+}
+
+
 # Map shortened commands to full command names
 def map_shortened_commands(args):
-    # Map for shortened aliases to full command names
-    command_aliases = {
-        "a": "add",
-        "l": "list",
-        "s": "search",
-        "c": "connect",
-        "d": "delete",
-        "e": "edit",
-        "i": "import",
-        "x": "export",
-    }
-
     # Check if the first argument is a known alias
-    if args[0] in command_aliases:
+    if args[0] in COMMAND_ALIASES:
         # Replace it with the full command name
-        args[0] = command_aliases[args[0]]
+        args[0] = COMMAND_ALIASES[args[0]]
     return args
 
 
+def connect(manager, args):
+    if len(args.alias_or_id) == 1:
+        manager.connect_to_alias_or_id(args.alias_or_id[0])
+    else:
+        manager.connect_many(args.alias_or_id)
+
+
+# Command name -> handler taking the service and the parsed arguments
+DISPATCH = {
+    "add": lambda manager, args: manager.add_connection(),
+    "edit": lambda manager, args: manager.edit_connection(args.alias_or_id),
+    "delete": lambda manager, args: manager.delete_connection(args.alias_or_id),
+    "list": lambda manager, args: manager.get_connections_summary(args.protocol_or_tag),
+    "search": lambda manager, args: manager.search_connections(args.text, args.prefix),
+    "connect": connect,
+    "import": lambda manager, args: manager.import_connections(args.json_file),
+    "export": lambda manager, args: manager.export_connections(
+        args.json_file, args.indent
+    ),
+}
+
+
 # Main function
 def main():
     if len(sys.argv) < 2:
@@ -110,32 +147,14 @@ def main():
     parser = parse_args()
     args = parser.parse_args(mapped_args)
 
-    db = DatabaseConnection(DB_PATH)
-    manager = ConnectionService(db)
-
-    if args.command.casefold() == "add":
-        manager.add_connection()
-
-    elif args.command == "edit":
-        manager.edit_connection(args.alias_or_id)
-
-    elif args.command.casefold() == "delete":
-        manager.delete_connection(args.alias_or_id)
-
-    elif args.command.casefold() == "list":
-        manager.get_connections_summary(args.protocol_or_tag)
-
-    elif args.command.casefold() == "search":
-        manager.search_connections(args.text)
-
-    elif args.command.casefold() == "connect":
-        manager.connect_to_alias_or_id(args.alias_or_id)
-
-    elif args.command == "import":
-        manager.import_connections(args.json_file)
+    # Imported only once the arguments are valid, so --help and usage errors
+    # don't pay for loading sqlite3, asyncio and the handlers
+    from connmanager.connection_service import ConnectionService
+    from connmanager.database_connection import DatabaseConnection
 
-    elif args.command == "export":
-        manager.export_connections(args.json_file)
+    db = DatabaseConnection(os.path.expanduser(DB_PATH))
+    with ConnectionService(db) as manager:
+        DISPATCH[args.command](manager, args)
 
 
 # Run the main function
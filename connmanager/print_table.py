@@ -1,5 +1,37 @@
 import json
-import textwrap
+import sys
+
+
+def _fast_wrap(text, width):
+    """
+    Splits text into lines of at most ``width`` characters, breaking at the last space that fits and splitting
+    words that are longer than a whole line. Tabs and newlines are treated as spaces.
+    """
+    if not text.isprintable():
+        text = " ".join(text.split())
+    # Spaces at the end of a line are dropped, so the ones ending the text are too
+    text = text.rstrip(" ")
+    lines = []
+    start = 0
+    while len(text) - start > width:
+        end = text.rfind(" ", start, start + width + 1)
+        line = text[start:end].rstrip(" ") if end > start else ""
+        if line:
+            lines.append(line)
+        elif text[start] == " ":
+            # Leading spaces before a word that doesn't fit are dropped with the line
+            end = start
+        else:
+            # No space to break at, so split the word itself
+            end = start + width
+            lines.append(text[start:end])
+        # Skip the whole run of spaces so the next line doesn't start with one
+        start = end
+        while start < len(text) and text[start] == " ":
+            start += 1
+    if start < len(text) or not lines:
+        lines.append(text[start:])
+    return lines
 
 
 def print_json_as_table(data, title=None, wrap_length=500):
@@ -7,8 +39,9 @@ def print_json_as_table(data, title=None, wrap_length=500):
     Prints a list of flat dictionaries or a JSON string representing such a list as a formatted table with automatic
     wrapping.
 
-    :param data: A JSON string or list of dictionaries representing the table data. Each dict is a row in the table.
-    :type data: str or list
+    :param data: A JSON string or list of dictionaries (or namedtuples) representing the table data. Each dict is a
+                 row in the table.
+    :type data: str or iterable
     :param title: An optional title to be printed above the table. Defaults to None.
     :type title: str, optional
     :param wrap_length: The maximum number of characters for each line in a cell before wrapping to the next line.
@@ -26,6 +59,14 @@ def print_json_as_table(data, title=None, wrap_length=500):
     # If the input is a string, assume it's a JSON string and parse it
     if isinstance(data, str):
         data = json.loads(data)
+    # Column widths need every row, so other iterables (e.g. generators) are
+    # collected once here
+    elif not isinstance(data, (list, dict)):
+        data = list(data)
+
+    # Rows may also be namedtuples, such as the database's summary rows
+    if isinstance(data, list) and data and hasattr(data[0], "_asdict"):
+        data = [row._asdict() for row in data]
 
     # Ensure data is a list of dictionaries
     if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
@@ -36,48 +77,62 @@ def print_json_as_table(data, title=None, wrap_length=500):
     # Create headers
     headers = data[0].keys()
 
-    # Wrap text for each row and find the maximum width for each column
-    col_widths = {h: len(h) for h in headers}
+    # Wrap each cell once, keeping the lines for printing along with the width
+    # of each cell
+    wrapped_rows = []
+    cell_widths = []
     for row in data:
+        wrapped_row = []
         for h in headers:
             cell = str(row[h])
-            wrapped = (
-                textwrap.wrap(cell, width=wrap_length)
-                if len(cell) > wrap_length
-                else [cell]
-            )
-            col_widths[h] = max(col_widths[h], max(len(w) for w in wrapped))
+            if len(cell) <= wrap_length and cell.isprintable():
+                wrapped_row.append([cell])
+            else:
+                wrapped_row.append(_fast_wrap(cell, wrap_length))
+        wrapped_rows.append(wrapped_row)
+        cell_widths.append([max(map(len, wrapped)) for wrapped in wrapped_row])
+
+    # Find the maximum width for each column with one reduction per column
+    col_widths = {
+        h: max(len(h), *widths) for h, widths in zip(headers, zip(*cell_widths))
+    }
 
     # Add extra space for padding and vertical separators
     total_width = sum(col_widths.values()) + 3 * (len(headers) - 1) + 4
 
-    # Calculate and print the separator line
+    # Calculate the separator line. The table is collected line by line and
+    # written in one go rather than with a print() per line
     sep_line = "-" * total_width
-    print(sep_line)
+    out = [sep_line]
 
-    # Print the title, if provided
+    # Add the title, if provided
     if title:
-        print("| " + f"{title.center(total_width - 4)} " + "|")
-        print(sep_line)
+        out.append("| " + f"{title.center(total_width - 4)} " + "|")
+        out.append(sep_line)
 
-    # Print the headers
+    # Add the headers
     # print("| " + " | ".join(f"{h.title():{col_widths[h]}}" for h in headers) + " |")
     # print(sep_line)
-    print("| " + " | ".join(f"{h.title():^{col_widths[h]}}" for h in headers) + " |")
-    print(sep_line)
+    out.append(
+        "| " + " | ".join(f"{h.title():^{col_widths[h]}}" for h in headers) + " |"
+    )
+    out.append(sep_line)
 
-    # Print each row with wrapped text
-    for row in data:
-        wrapped_rows = {
-            h: textwrap.wrap(str(row[h]), width=col_widths[h]) for h in headers
-        }
-        max_lines = max(len(wrapped) for wrapped in wrapped_rows.values())
+    # Add each row with wrapped text, using format strings built once per table
+    fmts = [f"{{:{col_widths[h]}}}" for h in headers]
+    for wrapped_row in wrapped_rows:
+        max_lines = max(len(wrapped) for wrapped in wrapped_row)
         for line_idx in range(max_lines):
-            line = "| "
-            for h in headers:
-                cell = (
-                    wrapped_rows[h][line_idx] if line_idx < len(wrapped_rows[h]) else ""
-                )
-                line += f"{cell:{col_widths[h]}} | "
-            print(line)
-        print(sep_line)
+            cells = (
+                wrapped[line_idx] if line_idx < len(wrapped) else ""
+                for wrapped in wrapped_row
+            )
+            out.append(
+                "| "
+                + " | ".join(fmt.format(cell) for fmt, cell in zip(fmts, cells))
+                + " | "
+            )
+        out.append(sep_line)
+
+    # Print the whole table
+    sys.stdout.write("\n".join(out) + "\n")
@@ -1,3 +1,5 @@
+from pathlib import Path
+
 from setuptools import find_packages, setup
 
 setup(
@@ -12,7 +14,9 @@ setup(
     author="Shane Bebber",
     author_email="shanebebber@gmail.com",
     description="A connection manager for SSH, RDP, VNC, and VMRC.",
-    long_description=open("README.md").read(),
+    long_description=(Path(__file__).parent / "README.md").read_text(
+        encoding="utf-8"
+    ),
     long_description_content_type="text/markdown",
     url="https://github.com/sugashane/connmanager",
     classifiers=[
@@ -20,5 +24,5 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.7",
 )